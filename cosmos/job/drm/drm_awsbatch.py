@@ -1,16 +1,36 @@
+import asyncio
+import atexit
+import collections
+import contextlib
+import functools
 import getpass
+import hashlib
+import io
+import json
 import os
 import pprint
 import random
 import re
 import string
 import sys
+import threading
 import time
+from concurrent.futures import as_completed, wait
 from concurrent.futures.thread import ThreadPoolExecutor
+from itertools import chain, starmap
 
 import boto3
 import more_itertools
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from botocore.exceptions import ClientError
+
+try:
+    import aioboto3
+
+    aioboto3_available = True
+except ImportError:
+    aioboto3_available = False
 
 from cosmos.api import TaskStatus
 from cosmos.job.drm.DRM_Base import DRM
@@ -19,20 +39,112 @@ from cosmos.constants import TERMINATION_SIGNALS
 
 
 MAX_THREADS = 50
-BOTO_CONFIG = Config(retries=dict(max_attempts=50, mode="adaptive"), max_pool_connections=25)
+# every thread in a pool of MAX_THREADS can share one client without queueing for a connection, and keepalive
+# stops idle pooled connections from being dropped between polls.  The timeouts are shorter than botocore's
+# defaults of 60s, so that a dead connection is retried instead of stalling the workflow.
+BOTO_CONFIG = Config(
+    retries=dict(max_attempts=50, mode="adaptive"),
+    max_pool_connections=MAX_THREADS,
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=30,
+)
+# uploads of large command scripts are split into parts that are sent in parallel
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True,
+)
+# the number of jobs per second filter_is_done aims to describe, DRM_AWSBatch.poll_interval backs off to stay under it
+DESCRIBE_JOBS_RATE_LIMIT = 100
+# the most job ids a single describe_jobs call accepts
+DESCRIBE_JOBS_MAX_JOB_IDS = 100
+# unused command scripts are deleted once this many have accumulated, or when no jobs are left running
+COMMAND_SCRIPT_DELETE_BATCH_SIZE = 500
+# statuses of jobs that will never change status again
+DONE_JOB_STATUSES = frozenset(["SUCCEEDED", "FAILED"])
+# for command scripts uploaded through the S3 Transfer Acceleration endpoint, see the s3_use_accelerate_endpoint
+# drm_option
+S3_ACCELERATE_BOTO_CONFIG = BOTO_CONFIG.merge(Config(s3=dict(use_accelerate_endpoint=True)))
+
+_JOB_NAME_RE = re.compile("^[A-Za-z0-9][A-Za-z0-9-_]*$")
+_RANDOM_STRING_ALPHABET = string.ascii_letters + string.digits
+# seeded from the OS, so random strings stay unique across workflows even if user code calls random.seed()
+_system_random = random.SystemRandom()
+
+# collects the logs of finished jobs, so that fetching them does not hold up the workflow loop
+_logs_pool = ThreadPoolExecutor(MAX_THREADS)
+
+_client_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_client(service_name):
+    # creating clients from the default boto3 session is not thread safe, but using them is
+    with _client_lock:
+        return boto3.client(service_name=service_name, config=BOTO_CONFIG)
+
+
+def _client(service_name, boto_config=None):
+    """
+    :return: a boto3 client for `service_name`.  Clients are expensive to create, so unless a custom `boto_config`
+      is passed in, one client per service is shared by the whole process.
+    """
+    if boto_config is None:
+        return _cached_client(service_name)
+    else:
+        return boto3.client(service_name=service_name, config=boto_config)
+
+
+@functools.lru_cache(maxsize=None)
+def _accelerated_s3_client():
+    with _client_lock:
+        return boto3.client(service_name="s3", config=S3_ACCELERATE_BOTO_CONFIG)
+
+
+def _use_accelerate_endpoint(task, s3_command_script_uri):
+    """
+    :return: True if `task` sets the s3_use_accelerate_endpoint drm_option, which uploads its command script through
+      the S3 Transfer Acceleration endpoint.  This can be a lot faster when far from the bucket's region.  Buckets
+      that don't have transfer acceleration enabled fall back to the regular endpoint.
+    """
+    return task.drm_options.get("s3_use_accelerate_endpoint", False) and _bucket_accelerate_enabled(
+        split_bucket_key(s3_command_script_uri)[0]
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _bucket_accelerate_enabled(bucket):
+    # accelerate endpoints don't support bucket names with dots
+    if "." in bucket:
+        return False
+    try:
+        response = _client("s3").get_bucket_accelerate_configuration(Bucket=bucket)
+    except ClientError:
+        # ie. no permission to check, so stick with the regular endpoint
+        return False
+    return response.get("Status") == "Enabled"
 
 
 def random_string(length):
-    return "".join([random.choice(string.ascii_letters + string.digits) for _ in range(length)])
+    return "".join(_system_random.choices(_RANDOM_STRING_ALPHABET, k=length))
 
 
 def split_bucket_key(s3_uri):
     """
     >>> split_bucket_key('s3://bucket/path/to/fname')
     ('bucket', 'path/to/fname')
+    >>> split_bucket_key('s3://bucket')
+    Traceback (most recent call last):
+      ...
+    ValueError: no prefix in s3://bucket
     """
-    bucket, key = re.search("s3://(.+?)/(.+)", s3_uri).groups()
-    if key == "":
+    if not s3_uri.startswith("s3://"):
+        raise ValueError("invalid s3 uri: %s" % s3_uri)
+    # plain string operations are a lot faster than a regex here
+    bucket, _, key = s3_uri[5:].partition("/")
+    if not bucket or not key:
         raise ValueError("no prefix in %s" % s3_uri)
     return bucket, key
 
@@ -61,13 +173,110 @@ def submit_script_as_aws_batch_job(
     :param environment: {env_name -> env_val} environment variables to set
     :return: obId, job_definition_arn, s3_command_script_uri.
     """
-    if environment is None:
-        environment = dict()
-    if tags is None:
-        tags = dict()
+    _validate_job_name(job_name)
+    _validate_s3_prefix(s3_prefix_for_command_script_temp_files)
+
+    s3_command_script_uri = os.path.join(
+        s3_prefix_for_command_script_temp_files, random_string(32) + "." + job_name + ".script"
+    )
+    upload_command_script(local_script_path, s3_command_script_uri)
+
+    jobId = submit_s3_script_as_aws_batch_job(
+        s3_command_script_uri,
+        job_name=job_name,
+        job_def_arn=job_def_arn,
+        job_queue=job_queue,
+        instance_type=instance_type,
+        memory=memory,
+        vpu_req=vpu_req,
+        gpu_req=gpu_req,
+        environment=environment,
+        tags=tags,
+    )
+
+    return jobId, s3_command_script_uri
+
 
+def upload_command_script(local_script_path, s3_command_script_uri, use_accelerate_endpoint=False):
+    """
+    :param use_accelerate_endpoint: upload through the S3 Transfer Acceleration endpoint.  The bucket must have
+      transfer acceleration enabled.
+    """
+    method, kwargs = _upload_command_script_request(local_script_path, s3_command_script_uri)
+    s3_client = _accelerated_s3_client() if use_accelerate_endpoint else _client("s3")
+    getattr(s3_client, method)(**kwargs)
+
+
+async def upload_command_script_async(s3_client, local_script_path, s3_command_script_uri):
+    method, kwargs = _upload_command_script_request(local_script_path, s3_command_script_uri)
+    await getattr(s3_client, method)(**kwargs)
+
+
+def _upload_command_script_request(local_script_path, s3_command_script_uri):
+    """
+    :return: (method, kwargs) of the s3 client call that uploads `local_script_path` to `s3_command_script_uri`.
+    """
+    bucket, key = split_bucket_key(s3_command_script_uri)
+    if os.path.getsize(local_script_path) < _TRANSFER_CONFIG.multipart_threshold:
+        # command scripts are usually small, so a single put_object skips the transfer manager's overhead
+        with open(local_script_path, "rb") as fp:
+            return "put_object", dict(Bucket=bucket, Key=key, Body=fp.read())
+    else:
+        return "upload_file", dict(
+            Filename=local_script_path, Bucket=bucket, Key=key, Config=_TRANSFER_CONFIG
+        )
+
+
+def submit_s3_script_as_aws_batch_job(s3_command_script_uri, **kwargs):
+    """
+    Like :func:`submit_script_as_aws_batch_job`, but runs a command script that is already on s3.
+
+    :param kwargs: job_name and the rest of the job parameters of :func:`submit_script_as_aws_batch_job`.
+    :return: jobId
+    """
+    submit_jobs_response = _client("batch").submit_job(**_submit_job_request(s3_command_script_uri, **kwargs))
+    return submit_jobs_response["jobId"]
+
+
+async def submit_s3_script_as_aws_batch_job_async(batch_client, s3_command_script_uri, **kwargs):
+    """
+    Same as :func:`submit_s3_script_as_aws_batch_job`, but awaits an aioboto3 batch client so that many
+    submissions can be in flight at once on a single event loop.
+    """
+    submit_jobs_response = await batch_client.submit_job(
+        **_submit_job_request(s3_command_script_uri, **kwargs)
+    )
+    return submit_jobs_response["jobId"]
+
+
+def _content_addressed_command_script_uri(
+    local_script_path, s3_prefix_for_command_script_temp_files, namespace, stage_name
+):
+    """
+    :return: an s3 uri for the script at `local_script_path` which is the same for any script with the same contents
+      in the same `namespace` and stage, so that those scripts can share one upload.  The stage name keeps a
+      leftover script traceable to the stage that wrote it.
+    """
+    _validate_s3_prefix(s3_prefix_for_command_script_temp_files)
+    with open(local_script_path, "rb") as fp:
+        digest = hashlib.sha256(fp.read()).hexdigest()
+    return os.path.join(
+        s3_prefix_for_command_script_temp_files, namespace, digest + "." + stage_name + ".script"
+    )
+
+
+def _validate_job_name(job_name):
     if " " in job_name or ":" in job_name:
         raise ValueError("job_name `%s` is invalid" % job_name)
+    if not _JOB_NAME_RE.match(job_name) or len(job_name) > 128:
+        raise ValueError(
+            f"{job_name} is not a valid job name.  "
+            f"The name of the job. The first character must be alphanumeric, and up to 128 letters "
+            f"(uppercase and lowercase), numbers, hyphens, and underscores are allowed."
+        )
+
+
+def _validate_s3_prefix(s3_prefix_for_command_script_temp_files):
     if s3_prefix_for_command_script_temp_files.endswith("/"):
         raise ValueError(
             "s3_prefix_for_command_script_temp_files should not have a "
@@ -78,24 +287,40 @@ def submit_script_as_aws_batch_job(
             "invalid s3_prefix_for_command_script_temp_files: %s" % s3_prefix_for_command_script_temp_files
         )
 
-    batch = boto3.client(service_name="batch", config=BOTO_CONFIG)
-    s3 = boto3.client(service_name="s3", config=BOTO_CONFIG)
-
-    bucket, key = split_bucket_key(s3_prefix_for_command_script_temp_files)
-    key = os.path.join(key, random_string(32) + "." + job_name + ".script")
-    s3.upload_file(local_script_path, bucket, key)
-    s3_command_script_uri = "s3://" + os.path.join(bucket, key)
-
-    # I could optionally add glances --stdout-csv here
-    # which would save the resource data to a s3_command_script_uri.resources.csv
-    # which i could parse on cleanup.
-    # This would require that the image have glances installed though, obviously.
-    command = (
-        "aws s3 cp --quiet {s3_command_script_uri} command_script && "
-        "chmod +x command_script && "
-        "./command_script"
-    )
-    command = command.format(**locals())
+
+# I could optionally add glances --stdout-csv here
+# which would save the resource data to a s3_command_script_uri.resources.csv
+# which i could parse on cleanup.
+# This would require that the image have glances installed though, obviously.
+_RUN_S3_SCRIPT_COMMAND = (
+    "aws s3 cp --quiet {s3_command_script_uri} command_script && "
+    "chmod +x command_script && "
+    "./command_script"
+)
+
+
+def _submit_job_request(
+    s3_command_script_uri,
+    job_name,
+    job_def_arn,
+    job_queue,
+    instance_type=None,
+    memory=1024,
+    vpu_req=1,
+    gpu_req=None,
+    environment=None,
+    tags=None,
+):
+    """
+    :return: the keyword arguments for a batch submit_job call that runs `s3_command_script_uri`.
+    """
+    _validate_job_name(job_name)
+    if environment is None:
+        environment = dict()
+    if tags is None:
+        tags = dict()
+
+    command = _RUN_S3_SCRIPT_COMMAND.format(s3_command_script_uri=s3_command_script_uri)
 
     container_overrides = {
         "resourceRequirements": [],
@@ -114,14 +339,7 @@ def submit_script_as_aws_batch_job(
         visible_devices = ",".join(map(str, list(range(gpu_req))))
         container_overrides["environment"].append({"name": "CUDA_VISIBLE_DEVICES", "value": visible_devices})
 
-    if not re.match("^[A-Za-z0-9][A-Za-z0-9-_]*$", job_name) or len(job_name) > 128:
-        raise ValueError(
-            f"{job_name} is not a valid job name.  "
-            f"The name of the job. The first character must be alphanumeric, and up to 128 letters "
-            f"(uppercase and lowercase), numbers, hyphens, and underscores are allowed."
-        )
-
-    submit_jobs_response = batch.submit_job(
+    return dict(
         jobName=job_name,
         jobQueue=job_queue,
         jobDefinition=job_def_arn,
@@ -129,53 +347,82 @@ def submit_script_as_aws_batch_job(
         propagateTags=True,
         tags=tags,
     )
-    jobId = submit_jobs_response["jobId"]
-
-    return jobId, s3_command_script_uri
 
 
 def get_logs_from_log_stream(
-    log_stream_name, attempts=9, sleep_between_attempts=10, boto_config=None, workflow=None
+    log_stream_name, attempts=9, sleep_between_attempts=2, boto_config=None, workflow=None
 ):
-    if boto_config is None:
-        boto_config = BOTO_CONFIG
-    logs_client = boto3.client(service_name="logs", config=boto_config)
-    try:
-        next_logs_token = None
-        messages = []
-        while True:
-            response = logs_client.get_log_events(
-                logGroupName="/aws/batch/job",
-                logStreamName=log_stream_name,
-                startFromHead=True,
-                **(dict(nextToken=next_logs_token) if next_logs_token is not None else dict()),
-            )
-            _check_aws_response_for_error(response)
-            messages += [e["message"] for e in response["events"]]
-            if next_logs_token == response["nextForwardToken"]:
-                break
-            else:
-                next_logs_token = response["nextForwardToken"]
+    # write messages straight into a buffer, rather than collecting a list to join at the end
+    messages = io.StringIO()
+    write_logs_from_log_stream(
+        messages,
+        log_stream_name,
+        attempts=attempts,
+        sleep_between_attempts=sleep_between_attempts,
+        boto_config=boto_config,
+        workflow=workflow,
+    )
+    return messages.getvalue()
 
-            if workflow is not None and workflow.termination_signal not in TERMINATION_SIGNALS:
-                break
 
-        return "\n".join(message for message in messages if not "\r" in message)
-    except logs_client.exceptions.ResourceNotFoundException:
-        if attempts <= 1:
-            return "log stream not found for log_stream_name: %s\n" % log_stream_name
-        else:
-            time.sleep(sleep_between_attempts)
-            return get_logs_from_log_stream(
-                log_stream_name, attempts=attempts - 1, sleep_between_attempts=sleep_between_attempts,
-            )
+def write_logs_from_log_stream(
+    fp, log_stream_name, attempts=9, sleep_between_attempts=2, boto_config=None, workflow=None
+):
+    """
+    Writes the messages of a log stream to the file object `fp` one page at a time, so that a long log is never
+    held in memory.
+    """
+    logs_client = _client("logs", boto_config)
+    start = fp.tell()
+    for attempt in range(1, attempts + 1):
+        try:
+            # throw away whatever a failed attempt already wrote, so that a retry doesn't repeat it
+            fp.seek(start)
+            fp.truncate()
+            separator = ""
+            for events in _paginate_log_events(logs_client, log_stream_name):
+                for event in events:
+                    message = event["message"]
+                    if "\r" not in message:
+                        fp.write(separator)
+                        fp.write(message)
+                        separator = "\n"
+
+                if workflow is not None and workflow.termination_signal in TERMINATION_SIGNALS:
+                    break
+
+            return
+        except logs_client.exceptions.ResourceNotFoundException:
+            # the log stream is usually created shortly after the job starts
+            if attempt < attempts:
+                time.sleep(sleep_between_attempts)
+
+    fp.write("log stream not found for log_stream_name: %s\n" % log_stream_name)
+
+
+def _paginate_log_events(logs_client, log_stream_name):
+    """
+    Yields the events of a log stream from the start, one page at a time.  botocore has no paginator for
+    get_log_events, and filter_log_events, which does, has a much lower request quota.
+    """
+    kwargs = dict(logGroupName="/aws/batch/job", logStreamName=log_stream_name, startFromHead=True)
+    while True:
+        response = logs_client.get_log_events(**kwargs)
+        _check_aws_response_for_error(response)
+        yield response["events"]
+        # the end of the stream has been reached when the same token comes back
+        if kwargs.get("nextToken") == response["nextForwardToken"]:
+            break
+        kwargs["nextToken"] = response["nextForwardToken"]
+
+
+def _get_log_stream_name(job_id, boto_config=None):
+    job_dict = get_aws_batch_job_infos([job_id], boto_config=boto_config)
+    return job_dict[0]["container"].get("logStreamName")
 
 
-def get_logs_from_job_id(job_id, attempts=9, sleep_between_attepts=10, boto_config=None, workflow=None):
-    if boto_config is None:
-        boto_config = BOTO_CONFIG
-    job_dict = get_aws_batch_job_infos([job_id], boto_config=boto_config)
-    log_stream_name = job_dict[0]["container"].get("logStreamName")
+def get_logs_from_job_id(job_id, attempts=9, sleep_between_attepts=2, boto_config=None, workflow=None):
+    log_stream_name = _get_log_stream_name(job_id, boto_config)
 
     if log_stream_name is None:
         return "no log stream was available for job: %s\n" % job_id
@@ -190,74 +437,291 @@ def get_logs_from_job_id(job_id, attempts=9, sleep_between_attepts=10, boto_conf
         )
 
 
+def write_logs(
+    job_id,
+    output_stdout_path,
+    log_stream_name=None,
+    attempts=3,
+    sleep_between_attempts=0,
+    workflow=None,
+    boto_config=None,
+):
+    """
+    Writes the logs of `job_id` to `output_stdout_path`.  This is thread safe, as long as none of the parameters
+    are sqlalchemy objects other than `workflow`.
+    """
+    # if log_stream_name wasn't passed in, query aws to get it
+    if log_stream_name is None:
+        log_stream_name = _get_log_stream_name(job_id, boto_config)
+
+    with open(output_stdout_path, "w") as fp:
+        if log_stream_name is None:
+            fp.write("no log stream was available for job: %s\n" % job_id)
+        else:
+            write_logs_from_log_stream(
+                fp,
+                log_stream_name,
+                attempts=attempts,
+                sleep_between_attempts=sleep_between_attempts,
+                workflow=workflow,
+                boto_config=boto_config,
+            )
+        fp.write(
+            "\n"
+            + "WARNING: this might be truncated.  "
+            + "check log stream on the aws console for job: %s" % job_id
+        )
+
+
 class JobStatusMismatchError(Exception):
     pass
 
 
 def _get_aws_batch_job_infos_for_batch(job_ids, batch_client, missing_ok=False):
-    # ensure that the list of job ids is unique
-    assert len(job_ids) == len(set(job_ids))
     describe_jobs_response = batch_client.describe_jobs(jobs=job_ids)
+    return _sort_describe_jobs_response(job_ids, describe_jobs_response, missing_ok)
+
+
+async def _get_aws_batch_job_infos_for_batch_async(job_ids, batch_client, missing_ok=False):
+    describe_jobs_response = await batch_client.describe_jobs(jobs=job_ids)
+    return _sort_describe_jobs_response(job_ids, describe_jobs_response, missing_ok)
+
+
+def _sort_describe_jobs_response(job_ids, describe_jobs_response, missing_ok=False):
+    """
+    :return: the jobs of a describe_jobs response, in the same order as the `job_ids` that were described.
+    """
     _check_aws_response_for_error(describe_jobs_response)
-    returned_jobs = sorted(describe_jobs_response["jobs"], key=lambda job: job_ids.index(job["jobId"]))
+    job_id_to_position = {job_id: i for i, job_id in enumerate(job_ids)}
+    returned_jobs = sorted(describe_jobs_response["jobs"], key=lambda job: job_id_to_position[job["jobId"]])
     if not missing_ok:
-        if sorted([job["jobId"] for job in returned_jobs]) != sorted(job_ids):
+        if len(returned_jobs) != len(job_ids) or {job["jobId"] for job in returned_jobs} != set(job_ids):
             raise JobStatusMismatchError()
     return returned_jobs
 
 
-def get_aws_batch_job_infos(all_job_ids, boto_config=None, missing_ok=False):
-    if boto_config is None:
-        boto_config = BOTO_CONFIG
+def _chunk_job_ids(all_job_ids):
+    """
+    :return: `all_job_ids` split into lists small enough for one describe_jobs call each.
+    """
     # ensure that the list of job ids is unique
     assert len(all_job_ids) == len(set(all_job_ids))
-    batch_client = boto3.client(service_name="batch", config=boto_config)
-    returned_jobs = []
-    for batch_job_ids in more_itertools.chunked(all_job_ids, 50):
-        batch_returned_jobs = _get_aws_batch_job_infos_for_batch(
-            batch_job_ids, batch_client, missing_ok=missing_ok
-        )
-        returned_jobs.extend(batch_returned_jobs)
+    return list(more_itertools.chunked(all_job_ids, DESCRIBE_JOBS_MAX_JOB_IDS))
+
+
+def get_aws_batch_job_infos(all_job_ids, boto_config=None, missing_ok=False, executor=None):
+    """
+    :param executor: a thread pool to describe the chunks of job ids in concurrently when there is more than one.
+      If it isn't passed in, a thread pool is created just for this call.
+    """
+    batch_client = _client("batch", boto_config)
+    chunks = _chunk_job_ids(all_job_ids)
+    get_infos = lambda batch_job_ids: _get_aws_batch_job_infos_for_batch(
+        batch_job_ids, batch_client, missing_ok=missing_ok
+    )
+    if len(chunks) > 1:
+        # describe the chunks concurrently, the client is thread safe.  map() preserves the order of the chunks.
+        if executor is not None:
+            returned_jobs = list(chain.from_iterable(executor.map(get_infos, chunks)))
+        else:
+            with ThreadPoolExecutor(min(len(chunks), MAX_THREADS)) as pool:
+                returned_jobs = list(chain.from_iterable(pool.map(get_infos, chunks)))
+    else:
+        returned_jobs = list(chain.from_iterable(map(get_infos, chunks)))
+
+    _check_returned_job_ids(all_job_ids, returned_jobs, missing_ok)
+    return returned_jobs
+
 
-    returned_ids = [job["jobId"] for job in returned_jobs]
+async def get_aws_batch_job_infos_async(all_job_ids, boto_config=None, missing_ok=False):
+    """
+    Same as :func:`get_aws_batch_job_infos`, but describes every chunk of job ids concurrently.  Must be run with
+    :func:`_run_async`.
+    """
+    chunks = _chunk_job_ids(all_job_ids)
+    batch_client = await _aio_client("batch", boto_config)
+    batches_returned_jobs = await asyncio.gather(
+        *[
+            _get_aws_batch_job_infos_for_batch_async(batch_job_ids, batch_client, missing_ok=missing_ok)
+            for batch_job_ids in chunks
+        ]
+    )
+    returned_jobs = list(chain.from_iterable(batches_returned_jobs))
+
+    _check_returned_job_ids(all_job_ids, returned_jobs, missing_ok)
+    return returned_jobs
+
+
+async def _gather_with_progress_bar(aws, prefix):
+    """
+    Like :func:`asyncio.gather`, but draws a progress bar as the awaitables complete when there is more than one.
+    """
+    futures = [asyncio.ensure_future(aw) for aw in aws]
+    if len(futures) > 1:
+        for future in progress_bar(asyncio.as_completed(futures), len(futures), prefix):
+            await future
+    return await asyncio.gather(*futures)
+
+
+def _check_returned_job_ids(all_job_ids, returned_jobs, missing_ok=False):
     if not missing_ok:
-        assert sorted(returned_ids) == sorted(all_job_ids), str(set(returned_ids) - set(all_job_ids)) + str(
-            set(all_job_ids) - set(returned_ids)
+        all_job_ids_set = set(all_job_ids)
+        returned_ids_set = {job["jobId"] for job in returned_jobs}
+        assert returned_ids_set == all_job_ids_set, str(returned_ids_set - all_job_ids_set) + str(
+            all_job_ids_set - returned_ids_set
         )
-    return returned_jobs
+
+
+class _EventLoopThread(object):
+    """
+    An event loop that runs in a daemon thread, and the aioboto3 clients used on it.  Both are created on first use
+    and then kept, since a new loop, session and clients (with new connections) for every call cost far more than
+    most of the calls themselves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._exit_stack = None
+        self._atexit_registered = False
+
+    def run(self, coro):
+        """
+        Runs `coro` on the loop and blocks until it is done.  This also works from a thread that already has a
+        running event loop (ie inside of a jupyter notebook).
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+        try:
+            return future.result()
+        except BaseException:
+            # ie. ctrl+C, so don't leave `coro` running in the background
+            future.cancel()
+            raise
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._session = aioboto3.Session()
+                self._clients = dict()
+                self._exit_stack = contextlib.AsyncExitStack()
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._run_forever, args=(self._loop,), name="awsbatch-event-loop", daemon=True
+                ).start()
+                if not self._atexit_registered:
+                    atexit.register(self.close)
+                    self._atexit_registered = True
+            return self._loop
+
+    @staticmethod
+    def _run_forever(loop):
+        loop.run_forever()
+        loop.close()
+
+    async def client(self, service_name, boto_config=None):
+        """
+        :return: the aioboto3 client for `service_name` and `boto_config`, which are shared by every coroutine run
+          on the loop.
+        """
+        assert asyncio.get_running_loop() is self._loop, "aioboto3 clients can only be used with _run_async()"
+        if boto_config is None:
+            boto_config = BOTO_CONFIG
+        key = service_name, boto_config
+        if key not in self._clients:
+            # a future rather than the client, so that coroutines asking at the same time share one client
+            self._clients[key] = asyncio.ensure_future(
+                self._exit_stack.enter_async_context(
+                    self._session.client(service_name=service_name, config=boto_config)
+                )
+            )
+        return await self._clients[key]
+
+    def close(self):
+        """
+        Closes the clients and stops the loop.  A later call to :meth:`run` starts over, since other atexit
+        handlers (ie terminating a workflow) may still need it.
+        """
+        with self._lock:
+            loop, exit_stack, self._loop = self._loop, self._exit_stack, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(exit_stack.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+
+_event_loop_thread = _EventLoopThread()
+
+
+def _run_async(coro):
+    """
+    Runs `coro` to completion on the event loop shared by every AWS Batch DRM, and returns its result.
+    """
+    return _event_loop_thread.run(coro)
+
+
+async def _aio_client(service_name, boto_config=None):
+    """
+    :return: the aioboto3 client for `service_name`, which every coroutine run by :func:`_run_async` shares.
+    """
+    return await _event_loop_thread.client(service_name, boto_config)
 
 
 def register_base_job_definition(container_image, environment, command, shm_size=None):
-    # register base job definition
-    container_properties = {
-        "image": container_image,
-        "jobRoleArn": "ecs_administrator",
-        "mountPoints": [{"containerPath": "/scratch", "readOnly": False, "sourceVolume": "scratch"}],
-        "volumes": [{"name": "scratch", "host": {"sourcePath": "/scratch"}}],
-        "resourceRequirements": [],
-        # run_s3_script
-        "command": ["bash", "-c", command],
-        "memory": 100,
-        "vcpus": 1,
-        "privileged": True,
-    }
+    resp = _client("batch").register_job_definition(
+        **_register_job_definition_request(container_image, environment, command, shm_size)
+    )
+    _check_aws_response_for_error(resp)
+    job_definition_arn = resp["jobDefinitionArn"]
+
+    return job_definition_arn
+
+
+async def register_base_job_definition_async(
+    batch_client, container_image, environment, command, shm_size=None
+):
+    """
+    Same as :func:`register_base_job_definition`, but awaits an aioboto3 batch client.
+    """
+    resp = await batch_client.register_job_definition(
+        **_register_job_definition_request(container_image, environment, command, shm_size)
+    )
+    _check_aws_response_for_error(resp)
+    return resp["jobDefinitionArn"]
+
+
+# the parts of a base job definition's container properties that are the same for every job definition.  This is
+# only ever shallow copied, so nothing may modify its values.
+_BASE_CONTAINER_PROPERTIES = {
+    "jobRoleArn": "ecs_administrator",
+    "mountPoints": [{"containerPath": "/scratch", "readOnly": False, "sourceVolume": "scratch"}],
+    "volumes": [{"name": "scratch", "host": {"sourcePath": "/scratch"}}],
+    "resourceRequirements": [],
+    "memory": 100,
+    "vcpus": 1,
+    "privileged": True,
+}
+
+
+def _register_job_definition_request(container_image, environment, command, shm_size):
+    """
+    :return: the keyword arguments for batch.register_job_definition() of a base job definition.
+    """
+    container_properties = dict(
+        _BASE_CONTAINER_PROPERTIES, image=container_image, command=["bash", "-c", command]
+    )
 
     if environment:
-        container_properties["environment"]: [{"name": key, "value": val} for key, val in environment.items()]
+        container_properties["environment"] = [
+            {"name": key, "value": val} for key, val in environment.items()
+        ]
 
     if shm_size:
         container_properties["linuxParameters"] = {"sharedMemorySize": shm_size}
 
-    batch = boto3.client(service_name="batch", config=BOTO_CONFIG)
-    resp = batch.register_job_definition(
+    return dict(
         jobDefinitionName="cosmos_base_job_definition",
         type="container",
         containerProperties=container_properties,
     )
-    _check_aws_response_for_error(resp)
-    job_definition_arn = resp["jobDefinitionArn"]
-
-    return job_definition_arn
 
 
 class DRM_AWSBatch(DRM):
@@ -268,180 +732,356 @@ class DRM_AWSBatch(DRM):
         "retry_only_if_status_reason_matches",  # ex: "host_terminated"
     }
 
-    _batch_client = None
-    _s3_client = None
     logger = None
+    min_poll_interval = 1
+    # while no jobs finish, the poll interval grows by this factor after every poll, up to max_poll_interval.  The
+    # JobManager sleeps for the longest poll interval of all DRMs with running tasks, so a long one would also delay
+    # noticing finished jobs of every other DRM.
+    poll_interval_backoff = 1.7
+    max_poll_interval = 10
 
     def __init__(self, log, workflow=None):
         self.job_id_to_s3_script_uri = dict()
         super(DRM_AWSBatch, self).__init__(log, workflow)
 
-        self.image_to_job_definition = {}
+        # (container_image, shm_size) -> job definition arn
+        self.job_definition_arns = {}
+        self._num_outstanding_jobs = 0
+        self._idle_poll_interval = self.min_poll_interval
+        # job_id -> future of the background thread writing that job's logs
+        self._log_futures = dict()
+        # tasks with identical command scripts share one copy on s3.  Keys are unique to this instance, so another
+        # workflow can never delete a script we are still using.
+        self._command_script_namespace = random_string(32)
+        # s3_command_script_uri -> number of submitted jobs still using it
+        self._command_script_refcounts = collections.Counter()
+        self._command_script_refcounts_lock = threading.Lock()
+        # s3 uris of command scripts no finished job needs anymore, waiting to be deleted in a batch
+        self._unused_command_scripts = set()
+        # created on first use, since a DRM is instantiated for every workflow whether it submits jobs or not
+        self._pool = None
+
+    @property
+    def poll_interval(self):
+        # every poll describes every outstanding job, so poll less often as the number of outstanding jobs grows,
+        # and while polls keep finding that none of them have finished
+        return max(self._idle_poll_interval, 1 + self._num_outstanding_jobs / DESCRIBE_JOBS_RATE_LIMIT)
 
     def shutdown(self):
-        for image, job_definition_arn in self.image_to_job_definition.items():
+        wait(list(self._log_futures.values()))
+        self._delete_unused_command_scripts()
+        for (image, shm_size), job_definition_arn in self.job_definition_arns.items():
             # self.log.info(f"Deregistering job definition for image: {image}")
             self.batch_client.deregister_job_definition(jobDefinition=job_definition_arn)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    @property
+    def pool(self):
+        """
+        A thread pool for the AWS calls of this DRM, shared by every call to submit_jobs() and kill_tasks() so
+        that its threads are only started once.
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(MAX_THREADS)
+        return self._pool
 
     @property
     def batch_client(self):
-        if self._batch_client is None:
-            self._batch_client = boto3.client(service_name="batch", config=BOTO_CONFIG)
-        return self._batch_client
+        return _client("batch")
 
     @property
     def s3_client(self):
-        if self._s3_client is None:
-            self._s3_client = boto3.client(service_name="s3", config=BOTO_CONFIG)
-        return self._s3_client
+        return _client("s3")
 
     def submit_job(self, task):
-        raise NotImplementedError("use .submit_jobs()")
+        self.submit_jobs([task])
 
-    def _submit_job(self, task):
+    def _submit_job(self, task, s3_command_script_uri, username, cwd):
         # THIS FUNCTION MUST WORK INSIDE A SEPARATE THREAD
-        if self.workflow.termination_signal not in TERMINATION_SIGNALS:
-            if task.queue is None:
-                raise ValueError("task.queue cannot be None for %s" % task)
-            if task.core_req is None:
-                raise ValueError("task.core_req cannot be None for task %s" % task)
-            if task.mem_req is None:
-                raise ValueError("task.mem_req cannot be None for task %s" % task)
-
-            job_name = "".join(
-                [
-                    f"cosmos__{getpass.getuser()}__",
-                    task.stage.name.replace("/", "__").replace(":", ""),
-                    "__",
-                    task.uid.replace("/", "__").replace(":", ""),
-                ]
-            )[
-                :128
-            ]  # job names can be a maximum of 128 characters
-            # task.workflow.log.info("Setting job name to: {}".format(job_name))
-
-            job_def_arn = self.image_to_job_definition[task.drm_options["container_image"]]
-            (jobId, s3_command_script_uri,) = submit_script_as_aws_batch_job(
-                local_script_path=task.output_command_script_path,
-                s3_prefix_for_command_script_temp_files=task.drm_options[
-                    "s3_prefix_for_command_script_temp_files"
-                ],
-                # container_image=task.drm_options["container_image"],
-                job_def_arn=job_def_arn,
-                job_name=job_name,
-                job_queue=task.queue,
-                memory=task.mem_req,
-                vpu_req=task.cpu_req,
-                gpu_req=task.gpu_req,
-                instance_type=task.drm_options.get("instance_type"),
-                tags=dict(
-                    job_type="cosmos",
-                    username=getpass.getuser(),
-                    stage_name=task.stage.name.replace("/", "__").replace(":", ""),
-                    cwd=os.getcwd(),
-                    argv=" ".join(sys.argv),
-                ),
-                environment=task.environment_variables,
-            )
+        if self.workflow.termination_signal in TERMINATION_SIGNALS:
+            return None, None
+        submit_kwargs = self._get_submit_kwargs(task, username, cwd)
+        jobId = submit_s3_script_as_aws_batch_job(s3_command_script_uri, **submit_kwargs)
+        return self._job_submitted(task, jobId, submit_kwargs)
+
+    async def _submit_job_async(self, task, s3_command_script_uri, username, cwd, batch_client):
+        if self.workflow.termination_signal in TERMINATION_SIGNALS:
+            return None, None
+        submit_kwargs = self._get_submit_kwargs(task, username, cwd)
+        jobId = await submit_s3_script_as_aws_batch_job_async(
+            batch_client, s3_command_script_uri, **submit_kwargs
+        )
+        return self._job_submitted(task, jobId, submit_kwargs)
 
-            # just save pointer to logstream.  We'll collect them when the job finishes.
-            # job_dict = get_aws_batch_job_infos([jobId], self.log)[0]  # , task.workflow.log)[0]
-            with open(task.output_stdout_path, "w"):
-                pass
-            with open(task.output_stderr_path, "w") as fp:
-                fp.write(pprint.pformat(dict(job_id=jobId), indent=2))
+    def _job_submitted(self, task, jobId, submit_kwargs):
+        """
+        :return: (jobId, job_definition_arn) of a job that was just submitted.
+        """
+        self._init_output_files(task, jobId)
+        return jobId, submit_kwargs["job_def_arn"]
 
-            return jobId, s3_command_script_uri, job_def_arn
+    async def _submit_jobs_async(
+        self, tasks, s3_command_script_uris, uploads, unregistered_keys, username, cwd
+    ):
+        batch_client, s3_client = await asyncio.gather(_aio_client("batch"), _aio_client("s3"))
+        if any(use_accelerate_endpoint for _, _, use_accelerate_endpoint in uploads):
+            accelerated_s3_client = await _aio_client("s3", S3_ACCELERATE_BOTO_CONFIG)
         else:
-            return None, None, None
+            accelerated_s3_client = None
+        # job definitions and command scripts don't depend on each other, so create them all at once
+        job_definition_arns, _ = await asyncio.gather(
+            asyncio.gather(
+                *[
+                    register_base_job_definition_async(
+                        batch_client, **_base_job_definition_kwargs(job_definition_key)
+                    )
+                    for job_definition_key in unregistered_keys
+                ]
+            ),
+            asyncio.gather(
+                *[
+                    upload_command_script_async(
+                        accelerated_s3_client if use_accelerate_endpoint else s3_client,
+                        local_script_path,
+                        s3_command_script_uri,
+                    )
+                    for local_script_path, s3_command_script_uri, use_accelerate_endpoint in uploads
+                ]
+            ),
+        )
+        self.job_definition_arns.update(zip(unregistered_keys, job_definition_arns))
 
-    def submit_jobs(self, tasks):
-        # Register job definitions for each container_image
-        for container_image, shm_size in set(
+        return await _gather_with_progress_bar(
             [
-                (
-                    task.drm_options["container_image"],
-                    task.drm_options["shm_size"] if "shm_size" in task.drm_options.keys() else None,
-                )
-                for task in tasks
-            ]
-        ):
-            if container_image not in self.image_to_job_definition:
-                self.log.info(f"Registering base job definition for image: {container_image}")
-                self.image_to_job_definition[container_image] = register_base_job_definition(
-                    container_image=container_image,
-                    environment=None,
-                    command="user-should-override-this",
-                    shm_size=shm_size,
-                )
+                self._submit_job_async(task, s3_command_script_uri, username, cwd, batch_client)
+                for task, s3_command_script_uri in zip(tasks, s3_command_script_uris)
+            ],
+            "Submitting",
+        )
 
-        if len(tasks) > 1:
-            with ThreadPoolExecutor(min(len(tasks), MAX_THREADS)) as pool:
-                rv = list(progress_bar(pool.map(self._submit_job, tasks), len(tasks), "Submitting"))
-        else:
-            # submit in serial without a progress bar
-            rv = list(map(self._submit_job, tasks))
+    def _get_submit_kwargs(self, task, username, cwd):
+        if task.queue is None:
+            raise ValueError("task.queue cannot be None for %s" % task)
+        if task.core_req is None:
+            raise ValueError("task.core_req cannot be None for task %s" % task)
+        if task.mem_req is None:
+            raise ValueError("task.mem_req cannot be None for task %s" % task)
 
-        for task, rv in zip(tasks, rv):
-            jobId, s3_command_script_uri, job_definition_arn = rv
+        job_name = "".join(
+            [
+                f"cosmos__{username}__",
+                task.stage.name.replace("/", "__").replace(":", ""),
+                "__",
+                task.uid.replace("/", "__").replace(":", ""),
+            ]
+        )[
+            :128
+        ]  # job names can be a maximum of 128 characters
+        # task.workflow.log.info("Setting job name to: {}".format(job_name))
+
+        return dict(
+            # container_image=task.drm_options["container_image"],
+            job_def_arn=self.job_definition_arns[_job_definition_key(task)],
+            job_name=job_name,
+            job_queue=task.queue,
+            memory=task.mem_req,
+            vpu_req=task.cpu_req,
+            gpu_req=task.gpu_req,
+            instance_type=task.drm_options.get("instance_type"),
+            tags=dict(
+                job_type="cosmos",
+                username=username,
+                stage_name=task.stage.name.replace("/", "__").replace(":", ""),
+                cwd=cwd,
+                argv=" ".join(sys.argv),
+            ),
+            environment=task.environment_variables,
+        )
 
-            if jobId is not None:
-                # set task attributes
-                task.drm_jobID = jobId
-                task.status = TaskStatus.submitted
-                task.s3_command_script_uri = s3_command_script_uri
-                task.job_definition_arn = job_definition_arn
+    def _init_output_files(self, task, jobId):
+        # just save pointer to logstream.  We'll collect them when the job finishes.
+        # job_dict = get_aws_batch_job_infos([jobId], self.log)[0]  # , task.workflow.log)[0]
+        with open(task.output_stdout_path, "w"):
+            pass
+        with open(task.output_stderr_path, "w") as fp:
+            json.dump(dict(job_id=jobId), fp, indent=2)
+
+    def submit_jobs(self, tasks):
+        # new jobs may finish quickly, so don't wait out a long idle interval before checking on them
+        self._idle_poll_interval = self.min_poll_interval
+
+        # Register a job definition for each distinct (container_image, shm_size)
+        unregistered_keys = [
+            job_definition_key
+            for job_definition_key in {_job_definition_key(task) for task in tasks}
+            if job_definition_key not in self.job_definition_arns
+        ]
+        for container_image, _ in unregistered_keys:
+            self.log.info(f"Registering base job definition for image: {container_image}")
+        if not aioboto3_available:
+            # concurrently when there is more than one, since each registration is a blocking API call.  The
+            # async path registers them alongside the command script uploads instead.
+            register = lambda job_definition_key: register_base_job_definition(
+                **_base_job_definition_kwargs(job_definition_key)
+            )
+            if len(unregistered_keys) > 1:
+                job_definition_arns = list(self.pool.map(register, unregistered_keys))
             else:
-                # self.procs[None] = None
-                # task.drm_jobID = None
-                task.status = TaskStatus.killed
+                job_definition_arns = list(map(register, unregistered_keys))
+            self.job_definition_arns.update(zip(unregistered_keys, job_definition_arns))
+
+        # Only upload command scripts that aren't already on s3 for another job, or waiting to be deleted
+        s3_command_script_uris = [
+            _content_addressed_command_script_uri(
+                task.output_command_script_path,
+                task.drm_options["s3_prefix_for_command_script_temp_files"],
+                self._command_script_namespace,
+                task.stage.name.replace("/", "__").replace(":", ""),
+            )
+            for task in tasks
+        ]
+        with self._command_script_refcounts_lock:
+            new_command_scripts = {
+                s3_command_script_uri: task
+                for task, s3_command_script_uri in zip(tasks, s3_command_script_uris)
+                if self._command_script_refcounts[s3_command_script_uri] == 0
+                and s3_command_script_uri not in self._unused_command_scripts
+            }
+            self._command_script_refcounts.update(s3_command_script_uris)
+            # ie. a failed task is being retried, so its script must not be deleted anymore
+            self._unused_command_scripts.difference_update(s3_command_script_uris)
+        # (local_script_path, s3_command_script_uri, use_accelerate_endpoint) of every command script to upload.
+        # Whether a bucket supports the accelerate endpoint is looked up here, since it is a blocking call.
+        uploads = [
+            (
+                task.output_command_script_path,
+                s3_command_script_uri,
+                _use_accelerate_endpoint(task, s3_command_script_uri),
+            )
+            for s3_command_script_uri, task in new_command_scripts.items()
+        ]
+
+        # these are the same for every task, and each is a syscall, so only look them up once
+        username, cwd = getpass.getuser(), os.getcwd()
+        submit_job = functools.partial(self._submit_job, username=username, cwd=cwd)
+
+        if aioboto3_available:
+            rv = _run_async(
+                self._submit_jobs_async(
+                    tasks, s3_command_script_uris, uploads, unregistered_keys, username, cwd
+                )
+            )
+            list(map(self._handle_submitted_job, tasks, s3_command_script_uris, rv))
+        elif len(tasks) > 1:
+            list(self.pool.map(lambda upload: upload_command_script(*upload), uploads))
+            future_to_task = {
+                self.pool.submit(submit_job, task, s3_command_script_uri): (task, s3_command_script_uri)
+                for task, s3_command_script_uri in zip(tasks, s3_command_script_uris)
+            }
+            # handle each job as soon as it is submitted, rather than in order behind any stragglers
+            for future in progress_bar(as_completed(future_to_task), len(tasks), "Submitting"):
+                self._handle_submitted_job(*future_to_task[future], future.result())
+        else:
+            # submit in serial without a progress bar
+            list(starmap(upload_command_script, uploads))
+            rv = list(map(submit_job, tasks, s3_command_script_uris))
+            list(map(self._handle_submitted_job, tasks, s3_command_script_uris, rv))
+
+    def _handle_submitted_job(self, task, s3_command_script_uri, rv):
+        jobId, job_definition_arn = rv
+
+        if jobId is not None:
+            # set task attributes
+            task.drm_jobID = jobId
+            task.status = TaskStatus.submitted
+            task.s3_command_script_uri = s3_command_script_uri
+            task.job_definition_arn = job_definition_arn
+        else:
+            # self.procs[None] = None
+            # task.drm_jobID = None
+            task.status = TaskStatus.killed
+            self._release_command_script(s3_command_script_uri)
 
     def filter_is_done(self, tasks):
         job_ids = [task.drm_jobID for task in tasks]
+        self._num_outstanding_jobs = len(job_ids)
         # assert len(set(job_ids)) == len(job_ids)  # this is no longer true if canceling job submitting,
         # because the canceled jobs have job_id = None
         if len(job_ids) == 0:
             job_id_to_job_dict = dict()
         else:
-            jobs = get_aws_batch_job_infos(job_ids)
+            if aioboto3_available:
+                jobs = _run_async(get_aws_batch_job_infos_async(job_ids))
+            else:
+                jobs = get_aws_batch_job_infos(job_ids, executor=self.pool)
             job_id_to_job_dict = {job["jobId"]: job for job in jobs}
 
         # FIXME this can get really slow when a lot of spot instances are dying
         # and make it hard to ctrl+C stuff
 
+        num_done = 0
+        try:
+            for task, job_info_dict in self._filter_is_done(tasks, job_id_to_job_dict):
+                num_done += 1
+                if num_done == len(tasks):
+                    # the workflow may finish as soon as the last job is handled, and successful tasks don't
+                    # wait for their logs in populate_logs(), so make sure every stdout file is written first
+                    wait(list(self._log_futures.values()))
+                yield task, job_info_dict
+        finally:
+            # delete command scripts in batches across polls, but don't leave any behind once every job is done
+            all_done = num_done == len(tasks)
+            if all_done or len(self._unused_command_scripts) >= COMMAND_SCRIPT_DELETE_BATCH_SIZE:
+                self._delete_unused_command_scripts()
+            if num_done:
+                self._idle_poll_interval = self.min_poll_interval
+            else:
+                self._idle_poll_interval = min(
+                    self._idle_poll_interval * self.poll_interval_backoff, self.max_poll_interval
+                )
+
+    def _filter_is_done(self, tasks, job_id_to_job_dict):
         for task in tasks:
             job_dict = job_id_to_job_dict[task.drm_jobID]
-            if job_dict["status"] in ["SUCCEEDED", "FAILED"]:
+            status = job_dict["status"]
+            if status in DONE_JOB_STATUSES:
                 # get exit status
-                if "attempts" in job_dict:
+                attempts = job_dict.get("attempts")
+                if attempts is not None:
                     try:  # this can be triggered by some role permissions issues
-                        attempt = job_dict["attempts"][-1]
+                        attempt = attempts[-1]
                     except:
-                        raise ValueError(f"Error with job_dict\n{pprint.pformat(job_dict, indent=2)}")
+                        raise ValueError(
+                            f"Error with job_dict\n{json.dumps(job_dict, indent=2, default=str)}"
+                        )
                     # if re.search("Host EC2 .+ terminated.", attempt["statusReason"]):
                     #     # this job failed because the instance was shut down (presumably because it was a
                     #     # spot instance)
                     #     status_reason = "host_terminated"
                     # else:
+                    attempt_container = attempt["container"]
                     status_reason = attempt.get("statusReason", None)
                     if status_reason:
                         # there's extra information about status reason here
-                        status_reason += " -- container_reason: " + str(
-                            attempt.get("container", dict()).get("reason")
+                        status_reason = (
+                            f"{status_reason} -- container_reason: {attempt_container.get('reason')}"
                         )
                     # exit code might be missing if for example the instance was terminated because the compute
                     # environment was deleted.
-                    exit_status = attempt["container"].get("exitCode", -2)
+                    exit_status = attempt_container.get("exitCode", -2)
                 else:
                     status_reason = "no_attempt"
                     exit_status = -1
 
-                if job_dict["status"] == "FAILED":
+                if status == "FAILED":
                     assert exit_status != 0, "%s failed, but has an exit_status of 0" % task
 
-                self.log.info(f"_cleanup_task {task}")
+                self.log.info("_cleanup_task %s", task)
                 self._cleanup_task(task, job_dict["container"].get("logStreamName"))
                 self.log.info("_cleanup_task done")
+                self._release_command_script(task.s3_command_script_uri)
                 try:
                     wall_time = int(round((job_dict["stoppedAt"] - job_dict["startedAt"]) / 1000))
                 except KeyError:
@@ -460,35 +1100,66 @@ class DRM_AWSBatch(DRM):
         # NOTE this code must be thread safe (cannot use any sqlalchemy)
 
         if get_log_attempts > 0:
-            # if log_stream_name wasn't passed in, query aws to get it
-            if log_stream_name is None:
-                logs = get_logs_from_job_id(
-                    job_id=task.drm_jobID,
-                    attempts=get_log_attempts,
-                    sleep_between_attepts=get_log_sleep_between_attempts,
-                    workflow=task.workflow,
-                    boto_config=boto_config,
-                )
-            else:
-                logs = get_logs_from_log_stream(
-                    log_stream_name=log_stream_name,
-                    attempts=get_log_attempts,
-                    sleep_between_attempts=get_log_sleep_between_attempts,
-                    workflow=task.workflow,
-                    boto_config=boto_config,
-                )
+            # fetching logs can take a while, so do it in the background.  populate_logs() waits for them if
+            # a failed task needs them.
+            job_id = task.drm_jobID
+            future = _logs_pool.submit(
+                write_logs,
+                job_id=job_id,
+                output_stdout_path=task.output_stdout_path,
+                log_stream_name=log_stream_name,
+                attempts=get_log_attempts,
+                sleep_between_attempts=get_log_sleep_between_attempts,
+                workflow=task.workflow,
+                boto_config=boto_config,
+            )
+            self._log_futures[job_id] = future
+            future.add_done_callback(functools.partial(self._logs_written, job_id))
 
-            with open(task.output_stdout_path, "w") as fp:
-                fp.write(
-                    logs
-                    + "\n"
-                    + "WARNING: this might be truncated.  "
-                    + "check log stream on the aws console for job: %s" % task.drm_jobID
+    def _release_command_script(self, s3_command_script_uri):
+        """
+        Called once for every job that no longer needs `s3_command_script_uri`.  Once no other jobs use it, it is
+        deleted with the next batch of unused command scripts.
+        """
+        # NOTE this code must be thread safe (cannot use any sqlalchemy)
+        with self._command_script_refcounts_lock:
+            self._command_script_refcounts[s3_command_script_uri] -= 1
+            if self._command_script_refcounts[s3_command_script_uri] <= 0:
+                del self._command_script_refcounts[s3_command_script_uri]
+                self._unused_command_scripts.add(s3_command_script_uri)
+
+    def _delete_unused_command_scripts(self):
+        with self._command_script_refcounts_lock:
+            unused_command_scripts, self._unused_command_scripts = self._unused_command_scripts, set()
+        self._delete_command_scripts(unused_command_scripts)
+
+    def _delete_command_scripts(self, s3_command_script_uris):
+        # delete_objects takes up to 1000 keys from a single bucket per request
+        bucket_to_keys = collections.defaultdict(list)
+        # sorted, so that the requests don't depend on the order of a set
+        for s3_command_script_uri in sorted(s3_command_script_uris):
+            bucket, key = split_bucket_key(s3_command_script_uri)
+            bucket_to_keys[bucket].append(key)
+        for bucket, keys in bucket_to_keys.items():
+            for chunk in more_itertools.chunked(keys, 1000):
+                response = self.s3_client.delete_objects(
+                    Bucket=bucket, Delete=dict(Objects=[dict(Key=key) for key in chunk], Quiet=True)
                 )
-
-        # delete temporary s3 script path
-        bucket, key = split_bucket_key(task.s3_command_script_uri)
-        self.s3_client.delete_object(Bucket=bucket, Key=key)
+                for error in response.get("Errors", []):
+                    self.log.warning(f"Could not delete s3://{bucket}/{error['Key']}: {error.get('Message')}")
+
+    def _logs_written(self, job_id, future):
+        self._log_futures.pop(job_id, None)
+        if future.exception() is not None:
+            self.log.warning(f"Could not write logs for job {job_id}: {future.exception()}")
+
+    def populate_logs(self, task):
+        # the logs of successful tasks can finish writing in the background, but failed tasks get their stdout
+        # printed right away
+        if task.status != TaskStatus.successful:
+            future = self._log_futures.get(task.drm_jobID)
+            if future is not None:
+                wait([future])
 
     def drm_statuses(self, tasks):
         """
@@ -497,29 +1168,75 @@ class DRM_AWSBatch(DRM):
         job_ids = [task.drm_jobID for task in tasks]
         if len(job_ids) == 0:
             return {}
-        return {d["jobId"]: d["status"] for d in get_aws_batch_job_infos(job_ids, missing_ok=True)}
+        return {
+            d["jobId"]: d["status"]
+            for d in get_aws_batch_job_infos(job_ids, missing_ok=True, executor=self.pool)
+        }
 
     def _terminate_task(self, task):
         # NOTE this code must be thread safe (cannot use any sqlalchemy)
-        batch_client = boto3.client(service_name="batch", config=BOTO_CONFIG)
+        batch_client = self.batch_client
         # cancel_job_response = batch_client.cancel_job(jobId=task.drm_jobID, reason="terminated by cosmos")
         # _check_aws_response_for_error(cancel_job_response)
 
-        terminate_job_response = batch_client.terminate_job(
-            jobId=task.drm_jobID, reason="terminated by cosmos"
-        )
+        terminate_job_response = batch_client.terminate_job(**_terminate_job_request(task))
         _check_aws_response_for_error(terminate_job_response)
 
     def kill(self, task):
         # NOTE this code must be thread safe (cannot use any sqlalchemy)
         self._terminate_task(task)
+        self._task_killed(task)
+
+    async def _kill_async(self, task, batch_client):
+        terminate_job_response = await batch_client.terminate_job(**_terminate_job_request(task))
+        _check_aws_response_for_error(terminate_job_response)
+        self._task_killed(task)
+
+    def _task_killed(self, task):
+        # NOTE this code must be thread safe (cannot use any sqlalchemy)
         self._cleanup_task(task, get_log_attempts=0)
+        self._release_command_script(task.s3_command_script_uri)
+
+    async def _kill_tasks_async(self, tasks):
+        batch_client = await _aio_client("batch")
+        await _gather_with_progress_bar([self._kill_async(task, batch_client) for task in tasks], "Killing")
 
     def kill_tasks(self, tasks):
         if len(tasks):
-            with ThreadPoolExecutor(min(len(tasks), MAX_THREADS)) as pool:
-                self.log.info("Killing Tasks...")
-                list(progress_bar(pool.map(self.kill, tasks), count=len(tasks), prefix="Killing "))
+            self.log.info("Killing Tasks...")
+            if aioboto3_available:
+                _run_async(self._kill_tasks_async(tasks))
+            else:
+                list(progress_bar(self.pool.map(self.kill, tasks), count=len(tasks), prefix="Killing "))
+            # the command scripts of the killed jobs are deleted together, rather than one request per job
+            self._delete_unused_command_scripts()
+
+
+def _job_definition_key(task):
+    """
+    :return: the settings that a task's job definition depends on.  Everything else is overridden per job.
+    """
+    return task.drm_options["container_image"], task.drm_options.get("shm_size")
+
+
+def _terminate_job_request(task):
+    """
+    :return: the keyword arguments for a batch terminate_job call that kills `task`'s job.
+    """
+    return dict(jobId=task.drm_jobID, reason="terminated by cosmos")
+
+
+def _base_job_definition_kwargs(job_definition_key):
+    """
+    :return: the keyword arguments to register the base job definition for a :func:`_job_definition_key`.
+    """
+    container_image, shm_size = job_definition_key
+    return dict(
+        container_image=container_image,
+        environment=None,
+        command="user-should-override-this",
+        shm_size=shm_size,
+    )
 
 
 class JobStatusError(Exception):
@@ -527,10 +1244,14 @@ class JobStatusError(Exception):
 
 
 def _check_aws_response_for_error(r):
-    if "failures" in r and len(r["failures"]):
+    status_code = r["ResponseMetadata"]["HTTPStatusCode"]
+    # this is called after almost every request, so return right away in the usual case of no errors
+    if status_code == 200 and not r.get("failures"):
+        return
+
+    if r.get("failures"):
         raise Exception("Failures:\n{0}".format(pprint.pformat(r, indent=2)))
 
-    status_code = r["ResponseMetadata"]["HTTPStatusCode"]
     if status_code != 200:
         raise Exception(
             "Task status request received status code {0}:\n{1}".format(
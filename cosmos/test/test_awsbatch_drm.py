@@ -0,0 +1,327 @@
+import io
+import logging
+import time
+import types
+
+import pytest
+from botocore.stub import ANY, Stubber
+
+from cosmos.job.drm import drm_awsbatch
+from cosmos.job.drm.drm_awsbatch import DRM_AWSBatch
+
+S3_PREFIX = "s3://bucket/prefix"
+
+
+@pytest.fixture()
+def stubbed(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    # take the blocking code path, as when aioboto3 isn't installed.  See async_stubbed for the aioboto3 one.
+    monkeypatch.setattr(drm_awsbatch, "aioboto3_available", False)
+    monkeypatch.setattr(drm_awsbatch, "write_logs", lambda **kwargs: None)
+    drm_awsbatch._cached_client.cache_clear()
+    with Stubber(drm_awsbatch._client("batch")) as batch, Stubber(drm_awsbatch._client("s3")) as s3:
+        yield batch, s3
+        batch.assert_no_pending_responses()
+        s3.assert_no_pending_responses()
+    drm_awsbatch._cached_client.cache_clear()
+
+
+@pytest.fixture()
+def async_stubbed(stubbed, monkeypatch):
+    """
+    Stubs the aioboto3 batch and s3 clients, along with the blocking ones that the aioboto3 path still uses (ie to
+    delete command scripts).
+    """
+    pytest.importorskip("aioboto3")
+    monkeypatch.setattr(drm_awsbatch, "aioboto3_available", True)
+    # start with new clients, which pick up the credentials set by `stubbed`
+    drm_awsbatch._event_loop_thread.close()
+    aio_batch = Stubber(drm_awsbatch._run_async(drm_awsbatch._aio_client("batch")))
+    aio_s3 = Stubber(drm_awsbatch._run_async(drm_awsbatch._aio_client("s3")))
+    with aio_batch, aio_s3:
+        yield aio_batch, aio_s3, stubbed[1]
+        aio_batch.assert_no_pending_responses()
+        aio_s3.assert_no_pending_responses()
+    drm_awsbatch._event_loop_thread.close()
+
+
+def make_drm():
+    return DRM_AWSBatch(logging.getLogger(__name__), types.SimpleNamespace(termination_signal=None))
+
+
+def make_task(tmpdir, uid, script):
+    command_script = tmpdir.join(uid + ".sh")
+    command_script.write(script)
+    return types.SimpleNamespace(
+        uid=uid,
+        stage=types.SimpleNamespace(name="stage"),
+        queue="queue",
+        core_req=1,
+        cpu_req=1,
+        mem_req=1024,
+        gpu_req=None,
+        environment_variables={},
+        drm_options=dict(container_image="image", s3_prefix_for_command_script_temp_files=S3_PREFIX),
+        output_command_script_path=str(command_script),
+        output_stdout_path=str(tmpdir.join(uid + ".stdout")),
+        output_stderr_path=str(tmpdir.join(uid + ".stderr")),
+        workflow=None,
+    )
+
+
+def response(**kwargs):
+    return dict(kwargs, ResponseMetadata=dict(HTTPStatusCode=200))
+
+
+def job_dict(job_id, status):
+    job = dict(
+        jobId=job_id,
+        jobName=job_id,
+        jobQueue="queue",
+        jobDefinition="arn",
+        status=status,
+        startedAt=0,
+        container={},
+    )
+    if status in drm_awsbatch.DONE_JOB_STATUSES:
+        job.update(stoppedAt=1000, attempts=[dict(container=dict(exitCode=int(status == "FAILED")))])
+    return job
+
+
+def test_resubmitted_command_script_is_not_deleted(stubbed, tmpdir):
+    batch, s3 = stubbed
+    drm = make_drm()
+    task_a = make_task(tmpdir, "a", "exit 1\n")
+    task_b = make_task(tmpdir, "b", "sleep 60\n")
+
+    batch.add_response(
+        "register_job_definition",
+        response(jobDefinitionName="cosmos_base_job_definition", jobDefinitionArn="arn", revision=1),
+    )
+    for task in [task_a, task_b]:
+        s3.add_response("put_object", response())
+        batch.add_response("submit_job", response(jobName=task.uid, jobId="job-" + task.uid))
+        drm.submit_jobs([task])
+    script_a, script_b = task_a.s3_command_script_uri, task_b.s3_command_script_uri
+
+    # a fails while b is still running, so a's script waits to be deleted with the next batch
+    batch.add_response(
+        "describe_jobs", response(jobs=[job_dict("job-a", "FAILED"), job_dict("job-b", "RUNNING")])
+    )
+    assert [task for task, _ in drm.filter_is_done([task_a, task_b])] == [task_a]
+
+    # a retry of a runs the same script, which is still on s3, so there is nothing to upload
+    retry_a = make_task(tmpdir, "a", "exit 1\n")
+    batch.add_response("submit_job", response(jobName="a", jobId="job-a2"))
+    drm.submit_jobs([retry_a])
+    assert retry_a.s3_command_script_uri == script_a
+
+    # when b finishes, only b's script may be deleted, since the retry of a still needs its script
+    batch.add_response(
+        "describe_jobs", response(jobs=[job_dict("job-b", "SUCCEEDED"), job_dict("job-a2", "RUNNING")])
+    )
+    s3.add_response(
+        "delete_objects",
+        response(),
+        dict(
+            Bucket="bucket",
+            Delete=dict(Objects=[dict(Key=drm_awsbatch.split_bucket_key(script_b)[1])], Quiet=True),
+        ),
+    )
+    assert [task for task, _ in drm.filter_is_done([task_b, retry_a])] == [task_b]
+    drm._delete_unused_command_scripts()
+
+
+def test_command_script_uri(tmpdir):
+    task_a, task_b, task_c = (
+        make_task(tmpdir, uid, script) for uid, script in [("a", "echo\n"), ("b", "echo\n"), ("c", "exit\n")]
+    )
+    uri = lambda task, stage_name="stage": drm_awsbatch._content_addressed_command_script_uri(
+        task.output_command_script_path, S3_PREFIX, "namespace", stage_name
+    )
+    assert uri(task_a) == uri(task_b)
+    assert uri(task_a) != uri(task_c)
+    assert uri(task_a) != uri(task_a, "other_stage")
+    assert uri(task_a).startswith(S3_PREFIX + "/namespace/")
+    assert uri(task_a).endswith(".stage.script")
+
+
+def test_release_command_script():
+    drm = make_drm()
+    uri = S3_PREFIX + "/script"
+    drm._command_script_refcounts.update([uri, uri])
+
+    drm._release_command_script(uri)
+    assert drm._command_script_refcounts[uri] == 1
+    assert drm._unused_command_scripts == set()
+
+    drm._release_command_script(uri)
+    assert uri not in drm._command_script_refcounts
+    assert drm._unused_command_scripts == {uri}
+
+
+def test_delete_command_scripts(stubbed, caplog):
+    _, s3 = stubbed
+    drm = make_drm()
+    keys = ["prefix/%d.script" % i for i in range(1001)]
+    drm._unused_command_scripts.update(
+        ["s3://bucket/" + key for key in keys] + ["s3://other_bucket/prefix/0.script"]
+    )
+
+    # one request per bucket for every 1000 keys
+    delete_objects_params = lambda bucket, keys: dict(
+        Bucket=bucket, Delete=dict(Objects=[dict(Key=key) for key in keys], Quiet=True)
+    )
+    s3.add_response("delete_objects", response(), delete_objects_params("bucket", sorted(keys)[:1000]))
+    s3.add_response("delete_objects", response(), delete_objects_params("bucket", sorted(keys)[1000:]))
+    s3.add_response(
+        "delete_objects",
+        response(Errors=[dict(Key="prefix/0.script", Message="Access Denied")]),
+        delete_objects_params("other_bucket", ["prefix/0.script"]),
+    )
+    drm._delete_unused_command_scripts()
+
+    assert drm._unused_command_scripts == set()
+    assert "Could not delete s3://other_bucket/prefix/0.script: Access Denied" in caplog.text
+
+
+def test_sort_describe_jobs_response():
+    job_ids = ["job-a", "job-b", "job-c"]
+    jobs = [job_dict(job_id, "RUNNING") for job_id in ["job-c", "job-a", "job-b"]]
+
+    returned_jobs = drm_awsbatch._sort_describe_jobs_response(job_ids, response(jobs=jobs))
+    assert [job["jobId"] for job in returned_jobs] == job_ids
+
+    with pytest.raises(drm_awsbatch.JobStatusMismatchError):
+        drm_awsbatch._sort_describe_jobs_response(job_ids, response(jobs=jobs[1:]))
+    returned_jobs = drm_awsbatch._sort_describe_jobs_response(
+        job_ids, response(jobs=jobs[1:]), missing_ok=True
+    )
+    assert [job["jobId"] for job in returned_jobs] == ["job-a", "job-b"]
+
+
+def test_poll_interval_backoff(stubbed):
+    drm = make_drm()
+    assert drm.poll_interval == drm.min_poll_interval
+
+    # polls that find no finished jobs back off, up to max_poll_interval
+    poll_intervals = []
+    for _ in range(10):
+        list(drm.filter_is_done([]))
+        poll_intervals.append(drm.poll_interval)
+    assert poll_intervals == sorted(poll_intervals)
+    assert poll_intervals[0] == drm.min_poll_interval * drm.poll_interval_backoff
+    assert poll_intervals[-1] == drm.max_poll_interval
+
+    # newly submitted jobs may finish quickly
+    drm.submit_jobs([])
+    assert drm.poll_interval == drm.min_poll_interval
+
+
+def test_logs_are_written_when_the_last_job_is_yielded(stubbed, tmpdir, monkeypatch):
+    batch, s3 = stubbed
+    drm = make_drm()
+    task = make_task(tmpdir, "a", "echo\n")
+    task.drm_jobID = "job-a"
+    task.s3_command_script_uri = S3_PREFIX + "/script"
+
+    def write_logs(job_id, output_stdout_path, **kwargs):
+        time.sleep(0.1)
+        with open(output_stdout_path, "w") as fp:
+            fp.write("logs of %s" % job_id)
+
+    monkeypatch.setattr(drm_awsbatch, "write_logs", write_logs)
+    batch.add_response("describe_jobs", response(jobs=[job_dict("job-a", "SUCCEEDED")]))
+    s3.add_response("delete_objects", response())
+    for done_task, _ in drm.filter_is_done([task]):
+        assert tmpdir.join("a.stdout").read() == "logs of job-a"
+
+
+def test_write_logs_from_log_stream_retry(stubbed):
+    logs = Stubber(drm_awsbatch._client("logs"))
+    get_log_events = lambda message, token: response(
+        events=[dict(message=message)], nextForwardToken=token, nextBackwardToken="b"
+    )
+    logs.add_response("get_log_events", get_log_events("line", "t1"))
+    # ie. the log stream disappeared in between pages
+    logs.add_client_error("get_log_events", "ResourceNotFoundException")
+    logs.add_response("get_log_events", get_log_events("line", "t1"))
+    logs.add_response("get_log_events", get_log_events("more", "t2"))
+    logs.add_response("get_log_events", response(events=[], nextForwardToken="t2", nextBackwardToken="b"))
+
+    fp = io.StringIO("before\n")
+    fp.seek(0, io.SEEK_END)
+    with logs:
+        drm_awsbatch.write_logs_from_log_stream(fp, "log_stream", sleep_between_attempts=0)
+        logs.assert_no_pending_responses()
+    assert fp.getvalue() == "before\nline\nmore"
+
+
+def test_submit_poll_and_kill_async(async_stubbed, tmpdir):
+    aio_batch, aio_s3, s3 = async_stubbed
+    drm = make_drm()
+    task_a = make_task(tmpdir, "a", "echo\n")
+    task_b = make_task(tmpdir, "b", "echo\n")
+
+    # one job definition for the image, and one upload for the two identical command scripts
+    aio_batch.add_response(
+        "register_job_definition",
+        response(jobDefinitionName="cosmos_base_job_definition", jobDefinitionArn="arn", revision=1),
+    )
+    aio_s3.add_response("put_object", response(), dict(Bucket="bucket", Key=ANY, Body=b"echo\n"))
+    aio_batch.add_response("submit_job", response(jobName="a", jobId="job-1"))
+    aio_batch.add_response("submit_job", response(jobName="b", jobId="job-2"))
+    drm.submit_jobs([task_a, task_b])
+    assert {task_a.drm_jobID, task_b.drm_jobID} == {"job-1", "job-2"}
+    assert task_a.s3_command_script_uri == task_b.s3_command_script_uri
+    assert drm.job_definition_arns == {("image", None): "arn"}
+
+    aio_batch.add_response(
+        "describe_jobs",
+        response(jobs=[job_dict("job-1", "SUCCEEDED"), job_dict("job-2", "RUNNING")]),
+        dict(jobs=[task_a.drm_jobID, task_b.drm_jobID]),
+    )
+    assert [task.drm_jobID for task, _ in drm.filter_is_done([task_a, task_b])] == ["job-1"]
+
+    # the job definition is reused, and b still uses the uploaded script
+    task_c = make_task(tmpdir, "c", "exit\n")
+    aio_s3.add_response("put_object", response(), dict(Bucket="bucket", Key=ANY, Body=b"exit\n"))
+    aio_batch.add_response("submit_job", response(jobName="c", jobId="job-3"))
+    drm.submit_jobs([task_c])
+    assert task_c.drm_jobID == "job-3"
+
+    # killing the last jobs deletes every command script
+    aio_batch.add_response("terminate_job", response(), dict(jobId="job-2", reason="terminated by cosmos"))
+    aio_batch.add_response("terminate_job", response(), dict(jobId="job-3", reason="terminated by cosmos"))
+    s3.add_response(
+        "delete_objects",
+        response(),
+        dict(
+            Bucket="bucket",
+            Delete=dict(
+                Objects=[
+                    dict(Key=drm_awsbatch.split_bucket_key(uri)[1])
+                    for uri in sorted([task_b.s3_command_script_uri, task_c.s3_command_script_uri])
+                ],
+                Quiet=True,
+            ),
+        ),
+    )
+    drm.kill_tasks([task_b, task_c])
+
+
+def test_event_loop_restarts_after_close(async_stubbed):
+    aio_batch, _, _ = async_stubbed
+    batch_client = drm_awsbatch._run_async(drm_awsbatch._aio_client("batch"))
+    assert drm_awsbatch._run_async(drm_awsbatch._aio_client("batch")) is batch_client
+
+    drm_awsbatch._event_loop_thread.close()
+    new_batch_client = drm_awsbatch._run_async(drm_awsbatch._aio_client("batch"))
+    assert new_batch_client is not batch_client
+    with Stubber(new_batch_client) as new_aio_batch:
+        new_aio_batch.add_response("describe_jobs", response(jobs=[job_dict("job-a", "RUNNING")]))
+        jobs = drm_awsbatch._run_async(drm_awsbatch.get_aws_batch_job_infos_async(["job-a"]))
+        new_aio_batch.assert_no_pending_responses()
+    assert [job["jobId"] for job in jobs] == ["job-a"]
@@ -55,6 +55,7 @@ setup(
     license="GPL v3",
     install_requires=install_requires,
     extras_require={
+        "awsbatch": ["aioboto3"],
         "test": [
             "flask",
             "ipython",